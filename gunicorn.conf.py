@@ -0,0 +1,15 @@
+"""
+Gunicorn settings for running IntelliSpend with several Uvicorn worker processes.
+Gunicorn loads this file automatically: `gunicorn main:app`.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# Each worker opens its own asyncpg pool in the FastAPI startup event (after the
+# fork), so no pool is ever shared between processes. Postgres sees up to
+# workers * DB_POOL_MAX_SIZE connections; put PgBouncer in front (see
+# docker-compose.yml) or lower WEB_CONCURRENCY if that exceeds the server limit.
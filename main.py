@@ -3,26 +3,31 @@ Main FastAPI application for the IntelliSpend expense tracker.
 Handles API endpoints for managing users and expenses with user-sequential expense IDs.
 Includes an endpoint to export all data as a CSV for Power BI.
 """
+import asyncio
+import socket
 import sys
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from decimal import Decimal
-import io
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import Body, FastAPI, HTTPException, Depends, Path, Request
 from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 # --- PRE-FLIGHT CHECK ---
 try:
     import uvicorn
-    import pandas as pd
+    import asyncpg
+    import orjson
+    from cachetools import TTLCache
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
 except ImportError:
     print("\n--- FATAL ERROR ---")
     print("Required libraries are not installed.")
-    print("Please run: pip install 'fastapi[all]' psycopg2-binary pandas python-dotenv")
+    print("Please run: pip install 'fastapi[all]' asyncpg orjson redis cachetools python-dotenv")
     sys.exit(1)
 print("✅ All required libraries are found.")
 
@@ -36,6 +41,39 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("FATAL ERROR: DATABASE_URL environment variable is not set.")
 
+# Set when DATABASE_URL points at PgBouncer in transaction mode (see docker-compose.yml).
+# Server connections are then shared between clients, so asyncpg must not keep
+# named prepared statements on them.
+USE_PGBOUNCER = os.getenv("USE_PGBOUNCER", "").lower() in ("1", "true", "yes")
+
+# Optional Redis cache for the read endpoints. Caching is skipped when unset.
+REDIS_URL = os.getenv("REDIS_URL")
+
+
+# --- JSON SERIALIZATION ---
+def encode_decimal(value):
+    """orjson `default` hook: Decimal amounts become strings to keep their exact value."""
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_json(content) -> bytes:
+    """
+    Serializes with orjson, which natively handles everything but Decimal. UTC
+    timestamps end in "Z", matching what Pydantic emits for the response_model endpoints.
+    """
+    return orjson.dumps(content, default=encode_decimal, option=orjson.OPT_UTC_Z)
+
+
+# Only for bodies built by hand from database rows. Endpoints with a response_model
+# keep FastAPI's default response class, which serializes through Pydantic directly.
+class DecimalORJSONResponse(JSONResponse):
+    """JSON response rendered by dump_json, so it accepts the Decimal values returned by Postgres."""
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
 
 # --- FASTAPI APP INITIALIZATION ---
 app = FastAPI(
@@ -53,20 +91,213 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- GZIP COMPRESSION ---
+# Compresses responses for clients sending `Accept-Encoding: gzip` (including the
+# Power BI Web data source). The repetitive CSV export shrinks several times over.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+# --- DATABASE CONNECTION POOL ---
+# Connections are opened once per worker at startup and reused across requests,
+# so each request only pays for a pool checkout instead of a fresh TCP + TLS handshake.
+DB_POOL_MIN_SIZE = 5
+DB_POOL_MAX_SIZE = 20
+
+# asyncpg prepares every query server-side on its first execution on a connection
+# and reuses the prepared statement afterwards, so the hot queries are parsed and
+# planned once per connection. Cached statements are kept for the lifetime of the
+# connection instead of being re-prepared every few minutes. Disabled behind PgBouncer.
+DB_STATEMENT_CACHE_SIZE = 0 if USE_PGBOUNCER else 100
 
-# --- DATABASE CONNECTION ---
-def get_db_connection():
-    """Establishes and returns a database connection using the DATABASE_URL."""
+# TCP keepalives stop NAT/firewall idle timeouts from silently dropping pooled
+# connections, and let the kernel detect dead peers (~80 s). asyncpg then sees the
+# connection as closed and the pool reconnects on checkout instead of failing a query.
+DB_TCP_KEEPALIVE_IDLE_SECONDS = 30
+DB_TCP_KEEPALIVE_INTERVAL_SECONDS = 10
+DB_TCP_KEEPALIVE_COUNT = 5
+
+
+@app.on_event("startup")
+async def open_db_pool():
+    """Creates the asyncpg connection pool shared by all requests of this worker."""
     try:
-        # psycopg2 can connect directly using the connection string.
-        conn = psycopg2.connect(DATABASE_URL)
-        return conn
-    except psycopg2.OperationalError as e:
+        app.state.pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            max_cached_statement_lifetime=0,
+            # Keep idle connections open instead of closing them after 5 minutes,
+            # which would leave the pool cold again after a quiet period.
+            max_inactive_connection_lifetime=0,
+            init=init_db_connection,
+            server_settings={"application_name": "intellispend"},
+        )
+        await warm_db_pool(app.state.pool)
+    except (OSError, asyncpg.PostgresError) as e:
         print(f"❌ DATABASE CONNECTION FAILED: {e}")
         raise
 
 
+async def init_db_connection(conn):
+    """Enables TCP keepalives on every new pooled connection."""
+    # asyncpg has no keepalive connection options (libpq's keepalives=... DSN
+    # parameters would be sent to the server as settings), so set them on the socket.
+    # _transport is private: if an asyncpg upgrade removes it, skip keepalives rather
+    # than failing every new pool connection.
+    transport = getattr(conn, "_transport", None)
+    if transport is None:
+        return
+    sock = transport.get_extra_info("socket")
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (
+        ("TCP_KEEPIDLE", DB_TCP_KEEPALIVE_IDLE_SECONDS),
+        ("TCP_KEEPINTVL", DB_TCP_KEEPALIVE_INTERVAL_SECONDS),
+        ("TCP_KEEPCNT", DB_TCP_KEEPALIVE_COUNT),
+    ):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+async def warm_db_pool(pool):
+    """
+    Runs SELECT 1 concurrently on every minimum-size connection, so each one has
+    completed a full round trip before the first real request checks it out.
+    """
+    await asyncio.gather(*(pool.execute(PING_SQL) for _ in range(pool.get_min_size())))
+
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    """Closes every pooled connection when the server shuts down."""
+    await app.state.pool.close()
+
+
+async def get_db_connection(request: Request):
+    """Acquires a connection from the pool and releases it once the request is done."""
+    async with request.app.state.pool.acquire() as conn:
+        yield conn
+
+
+@contextmanager
+def database_errors(status_code: int = 400):
+    """
+    Turns any database error raised inside the block into an HTTPException, including
+    asyncpg's client-side errors (InterfaceError, e.g. DataError for an argument that
+    cannot be encoded), which are not PostgresError subclasses.
+    Single statements run in asyncpg's autocommit mode and multi-statement work uses
+    `async with conn.transaction()`, so a failed statement leaves nothing to roll back.
+    """
+    try:
+        yield
+    except (asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+        raise HTTPException(status_code=status_code, detail=f"Database error: {e}")
+
+
+# --- RESPONSE CACHE (REDIS) ---
+# Cached bodies are stored under versioned keys ("<name>:v<n>"). The version is read
+# before querying, and inserts bump it (INCR "<name>:version") instead of deleting the
+# body, so a read that raced an insert can only fill a key nobody will read again.
+# The TTLs just let such superseded bodies expire.
+EXPENSES_CACHE_TTL_SECONDS = 30
+EXPENSES_CACHE_MAX_BYTES = 1024 * 1024
+POWERBI_EXPORT_CACHE_KEY = "powerbi_export"
+POWERBI_EXPORT_CACHE_TTL_SECONDS = 60
+POWERBI_EXPORT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+
+@app.on_event("startup")
+async def open_redis():
+    """Creates the Redis client (backed by its own connection pool) if REDIS_URL is set."""
+    app.state.redis = aioredis.from_url(REDIS_URL) if REDIS_URL else None
+
+
+@app.on_event("shutdown")
+async def close_redis():
+    """Closes the Redis connection pool when the server shuts down."""
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+
+
+def expenses_cache_key(user_id: int) -> str:
+    """Name of the cached, serialized expense list of one user."""
+    return f"exp:{user_id}"
+
+
+async def versioned_cache_key(redis_client, name: str) -> str | None:
+    """
+    Returns the key holding the current version of the cached `name`, or None (no
+    caching for this request) without Redis or if Redis is unreachable.
+    """
+    if redis_client is None:
+        return None
+    try:
+        version = await redis_client.get(f"{name}:version")
+    except RedisError as e:
+        print(f"⚠️ REDIS GET FAILED: {e}")
+        return None
+    return f"{name}:v{int(version or 0)}"
+
+
+async def cache_get(redis_client, key: str | None) -> bytes | None:
+    """Returns the cached value, or None on a miss, without Redis or if Redis is unreachable."""
+    if redis_client is None or key is None:
+        return None
+    try:
+        return await redis_client.get(key)
+    except RedisError as e:
+        print(f"⚠️ REDIS GET FAILED: {e}")
+        return None
+
+
+async def cache_set(redis_client, key: str | None, value: bytes, ttl_seconds: int):
+    """Stores a value with a TTL. Cache failures never fail the request."""
+    if redis_client is None or key is None:
+        return
+    try:
+        await redis_client.setex(key, ttl_seconds, value)
+    except RedisError as e:
+        print(f"⚠️ REDIS SET FAILED: {e}")
+
+
+async def cache_invalidate(redis_client, *names: str):
+    """Bumps the version of each cached name. Cache failures never fail the request."""
+    if redis_client is None:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.incr(f"{name}:version")
+            await pipe.execute()
+    except RedisError as e:
+        print(f"⚠️ REDIS INCR FAILED: {e}")
+
+
+async def cache_stream(redis_client, key: str | None, chunks, ttl_seconds: int, max_bytes: int):
+    """
+    Yields `chunks` unchanged and, once the stream completes, stores the whole body
+    in Redis under `key`. Bodies larger than `max_bytes` are streamed but not cached.
+    """
+    buffered = [] if redis_client is not None and key is not None else None
+    size = 0
+    async for chunk in chunks:
+        if buffered is not None:
+            size += len(chunk)
+            if size <= max_bytes:
+                buffered.append(chunk)
+            else:
+                buffered = None
+        yield chunk
+    if buffered is not None:
+        await cache_set(redis_client, key, b"".join(buffered), ttl_seconds)
+
+
 # --- API MODELS (PYDANTIC) ---
+# user_id columns are Postgres INTEGER; larger ids cannot exist and asyncpg cannot encode them.
+PG_INT_MAX = 2**31 - 1
+
 class UserCreate(BaseModel):
     username: str
     email: str
@@ -82,7 +313,7 @@ class UserResponse(BaseModel):
     created_at: datetime
 
 class ExpenseCreate(BaseModel):
-    user_id: int
+    user_id: int = Field(le=PG_INT_MAX)
     amount: Decimal = Field(gt=0, description="The amount spent, must be positive.")
     category: str
     merchant: str | None = None
@@ -98,158 +329,338 @@ class ExpenseResponse(BaseModel):
     source: str
 
 
+# --- SQL QUERIES ---
+# Defined once at import time. asyncpg caches prepared statements by query text, so
+# every request reuses the same string (and the same server-side prepared statement).
+PING_SQL = "SELECT 1"
+
+# No conflict target: a clash on either the username or the email UNIQUE
+# constraint inserts nothing and returns no row, without an error and rollback.
+SIGNUP_SQL = """
+    INSERT INTO users (username, email) VALUES ($1, $2)
+    ON CONFLICT DO NOTHING
+    RETURNING user_id, username, email, created_at;
+"""
+
+LOGIN_SQL = "SELECT user_id, username, email, created_at FROM users WHERE username = $1 AND email = $2;"
+
+INSERT_EXPENSE_SQL = """
+    INSERT INTO expenses (user_id, amount, category, merchant, transaction_date, source)
+    VALUES ($1, $2, $3, $4, $5, 'manual')
+    RETURNING *;
+"""
+
+# Rows are inserted grouped by user_id so the numbering trigger locks users rows in
+# a consistent order across concurrent batches (no deadlocks); position keeps each
+# user's ids in list order.
+BULK_INSERT_EXPENSES_SQL = """
+    INSERT INTO expenses (user_id, amount, category, merchant, transaction_date, source)
+    SELECT user_id, amount, category, merchant, transaction_date, 'manual'
+    FROM unnest($1::int[], $2::numeric[], $3::text[], $4::text[], $5::timestamptz[])
+        WITH ORDINALITY AS batch(user_id, amount, category, merchant, transaction_date, position)
+    ORDER BY batch.user_id, position
+    RETURNING user_id, user_expense_id, amount, category, merchant, transaction_date, source;
+"""
+
+LIST_EXPENSES_SQL = """
+    SELECT user_id, user_expense_id, amount, category, merchant, transaction_date, source
+    FROM expenses WHERE user_id = $1 ORDER BY user_expense_id DESC LIMIT $2;
+"""
+
+LIST_EXPENSES_BEFORE_SQL = """
+    SELECT user_id, user_expense_id, amount, category, merchant, transaction_date, source
+    FROM expenses WHERE user_id = $1 AND user_expense_id < $2 ORDER BY user_expense_id DESC;
+"""
+
+HAS_EXPENSES_SQL = "SELECT EXISTS (SELECT 1 FROM expenses);"
+
+# Wrapped in COPY (...) TO STDOUT, so no trailing semicolon.
+EXPORT_SQL = """
+    SELECT
+        e.user_expense_id,
+        e.user_id,
+        u.username,
+        u.email,
+        e.amount,
+        e.category,
+        e.merchant,
+        e.transaction_date,
+        e.source
+    FROM
+        expenses e
+    LEFT JOIN
+        users u ON e.user_id = u.user_id
+    ORDER BY
+        e.transaction_date DESC
+"""
+
+
 # --- API ENDPOINTS ---
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to the IntelliSpend API"}
 
 # --- User Endpoints ---
 
 @app.post("/users/signup", response_model=UserResponse, status_code=201)
-def create_user(user: UserCreate, conn=Depends(get_db_connection)):
+async def create_user(user: UserCreate, conn=Depends(get_db_connection)):
     """Creates a new user and stores them in the database."""
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            sql_query = """
-                INSERT INTO users (username, email) VALUES (%s, %s)
-                RETURNING user_id, username, email, created_at;
-            """
-            cur.execute(sql_query, (user.username, user.email))
-            new_user = cur.fetchone()
-            conn.commit()
-            return new_user
-    except psycopg2.IntegrityError:
-        conn.rollback()
+    with database_errors():
+        new_user = await conn.fetchrow(SIGNUP_SQL, user.username, user.email)
+    if new_user is None:
         raise HTTPException(status_code=409, detail="A user with this username or email already exists.")
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=f"Database error: {e}")
-    finally:
-        if conn:
-            conn.close()
+    return dict(new_user)
+
+# (username, email) -> user row for successful logins. Users are never updated or
+# deleted through the API, so entries only expire to bound staleness from manual
+# database changes. Failed lookups are not cached, so new signups can log in at once.
+LOGIN_CACHE = TTLCache(maxsize=10000, ttl=300)
+
 
 @app.post("/users/login", response_model=UserResponse)
-def login_user(user: UserLogin, conn=Depends(get_db_connection)):
-    """Authenticates a user by checking their credentials against the database."""
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            sql_query = "SELECT user_id, username, email, created_at FROM users WHERE username = %s AND email = %s;"
-            cur.execute(sql_query, (user.username, user.email))
-            db_user = cur.fetchone()
-            if not db_user:
-                raise HTTPException(status_code=401, detail="Invalid username or email.")
-            return db_user
-    except psycopg2.Error as e:
-        raise HTTPException(status_code=400, detail=f"Database error: {e}")
-    finally:
-        if conn:
-            conn.close()
+async def login_user(user: UserLogin, request: Request):
+    """
+    Authenticates a user by checking their credentials against the database.
+    Successful lookups are cached in-process, so repeated logins skip the pool entirely.
+    """
+    cache_key = (user.username, user.email)
+    cached_user = LOGIN_CACHE.get(cache_key)
+    if cached_user is not None:
+        return cached_user
+
+    with database_errors():
+        async with request.app.state.pool.acquire() as conn:
+            db_user = await conn.fetchrow(LOGIN_SQL, user.username, user.email)
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid username or email.")
+    db_user = dict(db_user)
+    LOGIN_CACHE[cache_key] = db_user
+    return db_user
 
 
 # --- Expense Endpoints ---
 
 @app.post("/expenses/manual/", response_model=ExpenseResponse, status_code=201)
-def create_manual_expense(expense: ExpenseCreate, conn=Depends(get_db_connection)):
+async def create_manual_expense(expense: ExpenseCreate, request: Request, conn=Depends(get_db_connection)):
     """
-    Receives expense data, calculates the next user_expense_id for the user,
-    and inserts it into the database.
+    Receives expense data and inserts it into the database in a single round trip.
+    The next user_expense_id for the user is assigned by the
+    expenses_assign_user_expense_id trigger (see migrations/001_assign_user_expense_id.sql).
     """
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                "SELECT COALESCE(MAX(user_expense_id), 0) FROM expenses WHERE user_id = %s;",
-                (expense.user_id,)
-            )
-            max_id_row = cur.fetchone()
-            max_id = max_id_row['coalesce'] if max_id_row else 0
-            next_user_expense_id = max_id + 1
-
-            transaction_ts = expense.transaction_date or datetime.now()
-            sql_query = """
-                INSERT INTO expenses (user_id, user_expense_id, amount, category, merchant, transaction_date, source)
-                VALUES (%s, %s, %s, %s, %s, %s, 'manual')
-                RETURNING *;
-            """
-            cur.execute(sql_query, (
-                expense.user_id,
-                next_user_expense_id,
-                expense.amount,
-                expense.category,
-                expense.merchant,
-                transaction_ts
-            ))
-            new_expense = cur.fetchone()
-            conn.commit()
-            return new_expense
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=f"Database error: {e}")
-    finally:
-        if conn:
-            conn.close()
+    transaction_ts = expense.transaction_date or datetime.now(timezone.utc)
+    with database_errors():
+        new_expense = await conn.fetchrow(
+            INSERT_EXPENSE_SQL,
+            expense.user_id,
+            expense.amount,
+            expense.category,
+            expense.merchant,
+            transaction_ts
+        )
+    await cache_invalidate(
+        request.app.state.redis, expenses_cache_key(expense.user_id), POWERBI_EXPORT_CACHE_KEY
+    )
+    return dict(new_expense)
 
-@app.get("/expenses/{user_id}", response_model=list[ExpenseResponse])
-def get_user_expenses(user_id: int, conn=Depends(get_db_connection)):
-    """Fetches all expenses for a specific user, ordered by their sequential ID."""
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            sql_query = "SELECT * FROM expenses WHERE user_id = %s ORDER BY user_expense_id DESC;"
-            cur.execute(sql_query, (user_id,))
-            expenses = cur.fetchall()
-            return expenses
-    except psycopg2.Error as e:
-        raise HTTPException(status_code=400, detail=f"Database error: {e}")
-    finally:
-        if conn:
-            conn.close()
+MAX_BULK_EXPENSES = 1000
 
-# --- Power BI Data Export Endpoint ---
 
-@app.get("/expenses/powerbi_export", response_class=StreamingResponse)
-def export_expenses_for_powerbi(conn=Depends(get_db_connection)):
+@app.post("/expenses/bulk", status_code=201, responses={201: {"model": list[ExpenseResponse]}})
+async def create_bulk_expenses(
+    request: Request,
+    expenses: list[ExpenseCreate] = Body(max_length=MAX_BULK_EXPENSES),
+    conn=Depends(get_db_connection),
+):
     """
-    Fetches all expense data, joins it with user data, converts it to a pandas DataFrame,
-    and returns it as a CSV stream suitable for the Power BI Web data source.
+    Inserts a batch of up to MAX_BULK_EXPENSES expenses with a single
+    INSERT ... SELECT FROM unnest(...) round trip. Each user's user_expense_ids are
+    assigned by the numbering trigger in list order; rows are returned in list order.
     """
-    try:
-        sql_query = """
-            SELECT
-                e.user_expense_id,
-                e.user_id,
-                u.username,
-                u.email,
-                e.amount,
-                e.category,
-                e.merchant,
-                e.transaction_date,
-                e.source
-            FROM
-                expenses e
-            LEFT JOIN
-                users u ON e.user_id = u.user_id
-            ORDER BY
-                e.transaction_date DESC;
-        """
-        df = pd.read_sql_query(sql_query, conn)
-
-        if df.empty:
-             raise HTTPException(status_code=404, detail="No expense data found to export.")
-
-        stream = io.StringIO()
-        df.to_csv(stream, index=False)
-
-        response = StreamingResponse(
-            iter([stream.getvalue()]),
-            media_type="text/csv"
+    if not expenses:
+        return DecimalORJSONResponse(content=[], status_code=201)
+
+    now = datetime.now(timezone.utc)
+    with database_errors():
+        new_expenses = await conn.fetch(
+            BULK_INSERT_EXPENSES_SQL,
+            [expense.user_id for expense in expenses],
+            [expense.amount for expense in expenses],
+            [expense.category for expense in expenses],
+            [expense.merchant for expense in expenses],
+            [expense.transaction_date or now for expense in expenses],
         )
-        response.headers["Content-Disposition"] = "attachment; filename=intellispend_expenses.csv"
 
-        return response
+    user_ids = {expense.user_id for expense in expenses}
+    await cache_invalidate(
+        request.app.state.redis,
+        *(expenses_cache_key(user_id) for user_id in user_ids),
+        POWERBI_EXPORT_CACHE_KEY,
+    )
+    # Sorting both sides by user (then list position / assigned id) pairs each inserted
+    # row with the list entry it came from.
+    positions = sorted(range(len(expenses)), key=lambda i: expenses[i].user_id)
+    inserted = sorted(new_expenses, key=lambda row: (row["user_id"], row["user_expense_id"]))
+    columns = tuple(new_expenses[0].keys())
+    rows = [None] * len(expenses)
+    for position, row in zip(positions, inserted):
+        rows[position] = dict(zip(columns, row))
+    return DecimalORJSONResponse(content=rows, status_code=201)
+
+# No response_model: rows are serialized directly instead of being validated into one
+# ExpenseResponse each. `responses` keeps the schema in the OpenAPI docs.
+# `:int` keeps literal paths such as /expenses/powerbi_export, declared further down,
+# from being captured here and rejected as an invalid user_id.
+@app.get("/expenses/{user_id:int}", responses={200: {"model": list[ExpenseResponse]}})
+async def get_user_expenses(request: Request, user_id: int = Path(le=PG_INT_MAX)):
+    """
+    Fetches all expenses for a specific user, ordered by their sequential ID, and
+    streams them as a JSON array. The JSON is cached in Redis until the user's next insert.
+    """
+    redis_client = request.app.state.redis
+    cache_key = await versioned_cache_key(redis_client, expenses_cache_key(user_id))
+    cached = await cache_get(redis_client, cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    expense_stream = stream_user_expenses(request.app.state.pool, user_id)
+    # Runs the query up to the first batch before the response starts, so a database
+    # error is still reported as a 400 rather than cutting off a 200 mid-body.
+    await anext(expense_stream)
+
+    json_stream = cache_stream(
+        redis_client,
+        cache_key,
+        expense_stream,
+        EXPENSES_CACHE_TTL_SECONDS,
+        EXPENSES_CACHE_MAX_BYTES,
+    )
+    return StreamingResponse(json_stream, media_type="application/json")
+
+
+# Rows fetched per round trip while streaming an expense list.
+EXPENSES_STREAM_BATCH_SIZE = 1000
+
+
+def encode_expense_rows(rows) -> bytes:
+    """Encodes a batch of expense records as a JSON array."""
+    if not rows:
+        return b"[]"
+    # Records are tuples sharing one column description: read the names once
+    # and zip positionally rather than looking every field up by name per row.
+    columns = tuple(rows[0].keys())
+    return dump_json([dict(zip(columns, row)) for row in rows])
+
+
+async def stream_user_expenses(pool, user_id: int):
+    """
+    Reads a user's expenses EXPENSES_STREAM_BATCH_SIZE rows at a time. Yields an empty
+    marker chunk once the first batch is fetched, then the rows as consecutive pieces
+    of one JSON array. Memory stays bounded by the batch size however long the history is.
+    """
+    # The connection is held for the whole stream, so it is acquired here rather
+    # than through get_db_connection.
+    async with pool.acquire() as conn:
+        # Most histories fit in one batch: a single plain fetch, with no transaction
+        # or cursor round trips, answers them.
+        with database_errors():
+            rows = await conn.fetch(LIST_EXPENSES_SQL, user_id, EXPENSES_STREAM_BATCH_SIZE)
+        yield b""
+        if len(rows) < EXPENSES_STREAM_BATCH_SIZE:
+            yield encode_expense_rows(rows)
+            return
+
+        # Longer histories continue through a server-side cursor (which needs a
+        # transaction) from the last id sent. Drop each batch's brackets to splice it in.
+        yield b"[" + encode_expense_rows(rows)[1:-1]
+        async with conn.transaction():
+            cursor = await conn.cursor(LIST_EXPENSES_BEFORE_SQL, user_id, rows[-1]["user_expense_id"])
+            while rows := await cursor.fetch(EXPENSES_STREAM_BATCH_SIZE):
+                yield b"," + encode_expense_rows(rows)[1:-1]
+                if len(rows) < EXPENSES_STREAM_BATCH_SIZE:
+                    break
+        yield b"]"
+
+# --- Power BI Data Export Endpoint ---
 
-    except psycopg2.Error as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+# COPY output arrives in pieces as small as a single row. Re-chunking it to ~64 KB
+# keeps the number of ASGI sends (and gzip writes) per export low.
+CSV_EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+async def stream_csv_copy(conn, sql_query: str):
+    """
+    Runs `COPY (sql_query) TO STDOUT WITH CSV HEADER` on `conn` and yields the CSV
+    bytes in CSV_EXPORT_CHUNK_BYTES chunks, so the export never sits in memory.
+    """
+    # Bounded so a slow client applies backpressure to the COPY instead of buffering it.
+    chunks = asyncio.Queue(maxsize=16)
+
+    async def run_copy():
+        try:
+            await conn.copy_from_query(sql_query, output=chunks.put, format="csv", header=True)
+        except Exception as e:
+            await chunks.put(e)
+        else:
+            await chunks.put(None)
+
+    copy_task = asyncio.create_task(run_copy())
+    try:
+        buffer = bytearray()
+        while (chunk := await chunks.get()) is not None:
+            if isinstance(chunk, Exception):
+                raise chunk
+            buffer += chunk
+            if len(buffer) >= CSV_EXPORT_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
     finally:
-        if conn:
-            conn.close()
+        # Stops the COPY if the client disconnects before the export finishes, and
+        # waits for it so the connection is idle before it goes back to the pool.
+        copy_task.cancel()
+        await asyncio.gather(copy_task, return_exceptions=True)
+
 
+async def stream_powerbi_export(pool):
+    """
+    Checks out one connection for the whole export: raises a 404 HTTPException if
+    there are no expenses, otherwise yields an empty marker chunk followed by the CSV.
+    """
+    async with pool.acquire() as conn:
+        with database_errors(status_code=500):
+            has_expenses = await conn.fetchval(HAS_EXPENSES_SQL)
+        if not has_expenses:
+            raise HTTPException(status_code=404, detail="No expense data found to export.")
+        yield b""
+        async for chunk in stream_csv_copy(conn, EXPORT_SQL):
+            yield chunk
+
+
+@app.get("/expenses/powerbi_export", response_class=StreamingResponse)
+async def export_expenses_for_powerbi(request: Request):
+    """
+    Fetches all expense data joined with user data and streams it straight from
+    Postgres as CSV, suitable for the Power BI Web data source.
+    The CSV is cached in Redis until the next expense insert.
+    """
+    headers = {"Content-Disposition": "attachment; filename=intellispend_expenses.csv"}
+    redis_client = request.app.state.redis
+    cache_key = await versioned_cache_key(redis_client, POWERBI_EXPORT_CACHE_KEY)
+    cached = await cache_get(redis_client, cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="text/csv", headers=headers)
+
+    export_stream = stream_powerbi_export(request.app.state.pool)
+    # Runs the EXISTS check before the response starts, so an empty table is still a 404.
+    await anext(export_stream)
+
+    csv_stream = cache_stream(
+        redis_client,
+        cache_key,
+        export_stream,
+        POWERBI_EXPORT_CACHE_TTL_SECONDS,
+        POWERBI_EXPORT_CACHE_MAX_BYTES,
+    )
+    return StreamingResponse(csv_stream, media_type="text/csv", headers=headers)
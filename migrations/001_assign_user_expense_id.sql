@@ -0,0 +1,47 @@
+-- -----------------------------------------------------------------
+-- Assign `user_expense_id` inside Postgres
+-- -----------------------------------------------------------------
+-- Lets the API insert an expense in a single round trip instead of
+-- SELECT MAX(...) followed by INSERT. Safe to run more than once.
+BEGIN;
+
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS user_expense_id INTEGER;
+
+CREATE OR REPLACE FUNCTION assign_user_expense_id() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.user_expense_id IS NULL THEN
+        -- Locking the owning user row serialises concurrent inserts for the
+        -- same user, so two transactions can never read the same MAX.
+        PERFORM 1 FROM users WHERE user_id = NEW.user_id FOR NO KEY UPDATE;
+        SELECT COALESCE(MAX(user_expense_id), 0) + 1 INTO NEW.user_expense_id
+        FROM expenses
+        WHERE user_id = NEW.user_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS expenses_assign_user_expense_id ON expenses;
+CREATE TRIGGER expenses_assign_user_expense_id
+    BEFORE INSERT ON expenses
+    FOR EACH ROW EXECUTE FUNCTION assign_user_expense_id();
+
+-- Number any rows still missing an id, per user in insertion order, after
+-- the highest id that user already has. The ALTER above holds an exclusive
+-- lock, so no insert can interleave until COMMIT.
+WITH numbered AS (
+    SELECT expense_id,
+           user_expense_id IS NULL AS missing,
+           COALESCE(MAX(user_expense_id) OVER (PARTITION BY user_id), 0)
+               + row_number() OVER (PARTITION BY user_id, user_expense_id IS NULL ORDER BY expense_id)
+               AS next_id
+    FROM expenses
+)
+UPDATE expenses
+SET user_expense_id = numbered.next_id
+FROM numbered
+WHERE expenses.expense_id = numbered.expense_id AND numbered.missing;
+
+ALTER TABLE expenses ALTER COLUMN user_expense_id SET NOT NULL;
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- -----------------------------------------------------------------
+-- Index for per-user expense lookups
+-- -----------------------------------------------------------------
+-- Serves both the MAX(user_expense_id) lookup in the numbering trigger and
+-- `WHERE user_id = ? ORDER BY user_expense_id DESC` in GET /expenses/{user_id}
+-- straight from the index, without a Sort node.
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so apply
+-- this file with autocommit on (psql does so by default).
+--
+-- Check with:
+--   EXPLAIN ANALYZE SELECT * FROM expenses WHERE user_id = 1 ORDER BY user_expense_id DESC;
+--
+-- users.username and users.email are declared UNIQUE in table_query.sql, which
+-- already gives them unique indexes (users_username_key, users_email_key), so
+-- login and duplicate-signup checks are index lookups without extra indexes.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_user_seq_idx
+    ON expenses (user_id, user_expense_id DESC);
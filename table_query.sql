@@ -20,6 +20,7 @@ COMMENT ON COLUMN users.user_id IS 'Unique identifier for each user.';
 CREATE TABLE expenses (
     expense_id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    user_expense_id INTEGER NOT NULL,
     amount DECIMAL(10, 2) NOT NULL,
     category VARCHAR(50) NOT NULL,
     merchant VARCHAR(100),
@@ -29,8 +30,35 @@ CREATE TABLE expenses (
 
 COMMENT ON TABLE expenses IS 'Stores individual expense records for each user.';
 COMMENT ON COLUMN expenses.user_id IS 'Foreign key linking to the users table.';
+COMMENT ON COLUMN expenses.user_expense_id IS 'Per-user sequential expense number, assigned by trigger.';
 COMMENT ON COLUMN expenses.source IS 'The method of data entry (e.g., manual, sms).';
 
+-- Serves per-user MAX(user_expense_id) and ORDER BY user_expense_id DESC from the index.
+CREATE INDEX expenses_user_seq_idx ON expenses (user_id, user_expense_id DESC);
+
+
+-- -----------------------------------------------------------------
+-- Trigger assigning `user_expense_id`
+-- -----------------------------------------------------------------
+-- Numbers each user's expenses 1, 2, 3, ... at insert time.
+CREATE OR REPLACE FUNCTION assign_user_expense_id() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.user_expense_id IS NULL THEN
+        -- Locking the owning user row serialises concurrent inserts for the
+        -- same user, so two transactions can never read the same MAX.
+        PERFORM 1 FROM users WHERE user_id = NEW.user_id FOR NO KEY UPDATE;
+        SELECT COALESCE(MAX(user_expense_id), 0) + 1 INTO NEW.user_expense_id
+        FROM expenses
+        WHERE user_id = NEW.user_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER expenses_assign_user_expense_id
+    BEFORE INSERT ON expenses
+    FOR EACH ROW EXECUTE FUNCTION assign_user_expense_id();
+
 
 -- -----------------------------------------------------------------
 -- Sample Data Insertion